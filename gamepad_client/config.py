@@ -1,16 +1,31 @@
 
 # native imports
-import json
 from collections.abc import Mapping
+from types import MappingProxyType
 from typing import Any
 
+# pip imports
+try:
+  # optional, faster JSON parser
+  from orjson import loads as json_loads
+except ImportError:
+  from json import loads as json_loads
+
 
 def read_config(filename: str = "config/default.json") -> Mapping[str, Any]:
-  with open(filename, mode='r') as config_file:
-    return json.load(config_file)
+  with open(filename, mode='rb') as config_file:
+    return json_loads(config_file.read())
+
+
+# shared, immutable defaults for missing config entries
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+_DEFAULT_COLOR_OFF: tuple[int, int, int] = (1, 1, 1)
+_DEFAULT_COLOR_ON: tuple[int, int, int] = (15, 15, 15)
 
 
 class Linear_Poti:
+  __slots__ = ('uid', 'upper_threshold', 'lower_threshold')
+
   def __init__(
     self,
     **kwargs
@@ -21,16 +36,22 @@ class Linear_Poti:
 
 
 class RGB_Button:
+  __slots__ = ('uid', 'color_off', 'color_on')
+
   def __init__(
     self,
     **kwargs
   ) -> None:
     self.uid: str = kwargs.get('uid', '')
-    self.color_off: list[int] = kwargs.get('color_off', [1, 1, 1])
-    self.color_on: list[int] = kwargs.get('color_on', [15, 15, 15])
+    self.color_off: tuple[int, int, int] = tuple(kwargs.get('color_off', _DEFAULT_COLOR_OFF))
+    self.color_on: tuple[int, int, int] = tuple(kwargs.get('color_on', _DEFAULT_COLOR_ON))
 
 
 class Remote_Gamepad:
+  __slots__ = (
+    'host', 'port', 'index', 'encryption_key', 'encryption_mode', 'hotkey', 'rgb_button',
+  )
+
   def __init__(
     self,
     **kwargs
@@ -41,29 +62,35 @@ class Remote_Gamepad:
     self.encryption_key: str = kwargs.get('encryption_key', '')
     self.encryption_mode: str = kwargs.get('encryption_mode', 'AES-GCM')
     self.hotkey: str = kwargs.get('hotkey', '')
-    self.rgb_button: RGB_Button = RGB_Button(**kwargs.get('rgb_button', {}))
+    self.rgb_button: RGB_Button = RGB_Button(**kwargs.get('rgb_button', _EMPTY))
 
 
 class Tinkerforge_Settings:
+  __slots__ = ('host', 'port', 'linear_poti')
+
   def __init__(
     self,
     **kwargs
   ) -> None:
     self.host: str = kwargs.get('host', 'localhost')
     self.port: int = kwargs.get('port', 4223)
-    self.linear_poti: Linear_Poti = Linear_Poti(**kwargs.get('linear_poti', {}))
+    self.linear_poti: Linear_Poti = Linear_Poti(**kwargs.get('linear_poti', _EMPTY))
 
 
 class Client_Settings:
+  __slots__ = ('local_gamepad_index', 'remote_gamepads', 'tinkerforge')
+
   def __init__(
     self,
     **kwargs
   ) -> None:
     self.local_gamepad_index: int = kwargs.get('local_gamepad_index', 0)
     self.remote_gamepads: list[Remote_Gamepad] = [
-      Remote_Gamepad(**d) for d in kwargs.get('remote_gamepads', [])
+      Remote_Gamepad(**d) for d in kwargs.get('remote_gamepads', ())
     ]
-    self.tinkerforge: Tinkerforge_Settings = Tinkerforge_Settings(**kwargs.get('tinkerforge', {}))
+    self.tinkerforge: Tinkerforge_Settings = Tinkerforge_Settings(
+      **kwargs.get('tinkerforge', _EMPTY)
+    )
 
 
 def get_client_settings(config: Mapping) -> Client_Settings:
@@ -1,32 +1,52 @@
 
 # native imports
 import sys
-from time import sleep
+from collections.abc import Callable
+from functools import partial
 
 # pip imports
-from keyboard import is_pressed
+from keyboard import KEY_UP
+from keyboard import KeyboardEvent
+from keyboard import add_hotkey
+from keyboard import hook
 from keyboard import parse_hotkey
+from keyboard import remove_hotkey
+from keyboard import unhook
 
 # local imports
 from gamepad_client.tinkerforge_control import InputServerData
+from gamepad_client.tinkerforge_control import TinkerforgeControl
 from gamepad_client.tinkerforge_control import print_current_state
 
 
 class HotkeyManager:
   server_list: list[InputServerData]
+  tinkerforge_control: TinkerforgeControl
   hotkey_list: list[str]
-  keep_running: bool
+  # server indices toggled by each distinct hotkey
+  hotkey_indices: dict[str, list[int]]
+  # hotkeys that are completed by each scan code, re-armed when it is released
+  release_dict: dict[int, list[str]]
+  currently_pressed: dict[str, bool]
+  hotkey_handles: list
+  release_hook: Callable[[], None] | None
 
   def __init__(
     self,
     server_list: list[InputServerData],
     hotkey_list: list[str],
+    tinkerforge_control: TinkerforgeControl,
   ) -> None:
-    self.keep_running = True
     self.server_list = server_list
+    self.tinkerforge_control = tinkerforge_control
     self.hotkey_list = hotkey_list
-    self.currently_pressed: dict[str, bool] = {}
+    self.hotkey_indices = {}
+    self.release_dict = {}
+    self.currently_pressed = {}
+    self.hotkey_handles = []
+    self.release_hook = None
     self.verify_hotkeys()
+    self.register_hotkeys()
 
   def verify_hotkeys(self):
     for hotkey in self.hotkey_list:
@@ -40,15 +60,47 @@ class HotkeyManager:
           )
           sys.exit(1)
 
-  def scan_loop(self):
-    while self.keep_running:
-      for i, hotkey in enumerate(self.hotkey_list):
-        if is_pressed(hotkey):
-          if not self.currently_pressed.get(hotkey):
-            server = self.server_list[i]
-            server.active = not server.active
-            self.currently_pressed[hotkey] = True
-            print_current_state(self.server_list)
-        else:
-          self.currently_pressed[hotkey] = False
-      sleep(0.001)
+  def register_hotkeys(self):
+    for i, hotkey in enumerate(self.hotkey_list):
+      if hotkey:
+        self.hotkey_indices.setdefault(hotkey, []).append(i)
+
+    # callbacks are invoked from the keyboard hook thread,
+    # no polling thread required on our side
+    for hotkey in self.hotkey_indices:
+      self.hotkey_handles.append(add_hotkey(
+        hotkey,
+        partial(self._toggle, hotkey),
+        suppress=False,
+        trigger_on_release=False
+      ))
+      # last key of the last step completes the hotkey
+      for scan_code in parse_hotkey(hotkey)[-1][-1]:
+        self.release_dict.setdefault(scan_code, []).append(hotkey)
+
+    if self.release_dict:
+      self.release_hook = hook(self._on_key_event)
+
+  def unregister_hotkeys(self):
+    for handle in self.hotkey_handles:
+      remove_hotkey(handle)
+    self.hotkey_handles.clear()
+    if self.release_hook is not None:
+      unhook(self.release_hook)
+      self.release_hook = None
+
+  def _toggle(self, hotkey: str):
+    # held down keys repeat their key down events,
+    # only toggle once until the hotkey is released again
+    if self.currently_pressed.get(hotkey):
+      return
+    self.currently_pressed[hotkey] = True
+    for i in self.hotkey_indices[hotkey]:
+      server = self.server_list[i]
+      server.active = not server.active
+    print_current_state(self.tinkerforge_control, self.server_list)
+
+  def _on_key_event(self, event: KeyboardEvent):
+    if event.event_type == KEY_UP:
+      for hotkey in self.release_dict.get(event.scan_code, ()):
+        self.currently_pressed[hotkey] = False
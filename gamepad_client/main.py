@@ -2,11 +2,13 @@
 # native imports
 import os
 import sys
+from array import array
 from collections.abc import Mapping
 from functools import partial
+from socket import IPPROTO_TCP
 from socket import SHUT_RDWR
+from socket import TCP_NODELAY
 from threading import Thread
-from time import sleep
 
 # local imports
 from gamepad_client.keys import HotkeyManager
@@ -30,6 +32,9 @@ os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 import pygame  # noqa: E402
 
 
+# upper limit of reports sent per second
+MAX_FRAME_RATE: int = 250
+
 pygame_button_to_XUSB_Button: dict[int, XUSB_BUTTON] = {
   0: XUSB_BUTTON.XUSB_GAMEPAD_A,
   1: XUSB_BUTTON.XUSB_GAMEPAD_B,
@@ -49,6 +54,30 @@ pygame_button_to_XUSB_Button: dict[int, XUSB_BUTTON] = {
   15: XUSB_BUTTON.XUSB_GAMEPAD_BACK
 }
 
+# value range of the XInput joystick axes and triggers
+JOYSTICK_MAX: int = 32767
+TRIGGER_MAX: int = 255
+
+# number of pygame buttons that are mapped to XUSB buttons
+BUTTON_COUNT: int = max(pygame_button_to_XUSB_Button) + 1
+
+
+def _build_wButtons_table() -> array:
+  '''
+  Build a lookup table from a bitset of pressed pygame buttons
+  (bit i set = button i pressed) to the matching XUSB wButtons value.
+  '''
+  table: array = array('H', [0])
+  for i in range(BUTTON_COUNT):
+    xusb_button: XUSB_BUTTON | None = pygame_button_to_XUSB_Button.get(i)
+    mask: int = xusb_button.value if xusb_button is not None else 0
+    # second half of the table: same entries with button i pressed
+    table.extend([w_buttons | mask for w_buttons in table])
+  return table
+
+
+_wButtons_table: array = _build_wButtons_table()
+
 
 class XInput_REPORT_Builder(XInput_Gamepad):
   '''
@@ -77,18 +106,37 @@ class XInput_REPORT_Builder(XInput_Gamepad):
 
   def build_XInput_REPORT(
     self,
-    button_data: dict[int, bool],
+    buttons_bitset: int,
     axis_data: dict[int, float],
   ) -> AbstractReport:
-    self.report: AbstractReport = self.get_default_report()
-    i: int
-    for i in button_data:
-      self.report.wButtons += pygame_button_to_XUSB_Button[i].value * button_data[i]
-    self.left_joystick_float(axis_data.get(0, 0.0), -1 * axis_data.get(1, 0.0))
-    self.right_joystick_float(axis_data.get(2, 0.0), -1 * axis_data.get(3, 0.0))
-    self.left_trigger_float((axis_data.get(4, 0.0) + 1.0) / 2)
-    self.right_trigger_float((axis_data.get(5, 0.0) + 1.0) / 2)
-    return self.report
+    # every field is overwritten below, so the report is reused without a reset
+    report: AbstractReport = self.report
+    report.wButtons = _wButtons_table[buttons_bitset]
+    # same scaling as the *_joystick_float / *_trigger_float methods,
+    # written out to save the method calls per frame
+    get = axis_data.get
+    report.sThumbLX = round(get(0, 0.0) * JOYSTICK_MAX)
+    report.sThumbLY = round(get(1, 0.0) * -JOYSTICK_MAX)
+    report.sThumbRX = round(get(2, 0.0) * JOYSTICK_MAX)
+    report.sThumbRY = round(get(3, 0.0) * -JOYSTICK_MAX)
+    report.bLeftTrigger = round((get(4, 0.0) + 1.0) * (TRIGGER_MAX / 2))
+    report.bRightTrigger = round((get(5, 0.0) + 1.0) * (TRIGGER_MAX / 2))
+    return report
+
+  def report_state(self) -> tuple[int, ...]:
+    '''
+    Return the field values of the current report for cheap comparisons.
+    '''
+    report: AbstractReport = self.report
+    return (
+      report.wButtons,
+      report.bLeftTrigger,
+      report.bRightTrigger,
+      report.sThumbLX,
+      report.sThumbLY,
+      report.sThumbRX,
+      report.sThumbRY,
+    )
 
 
 class LocalController:
@@ -109,10 +157,17 @@ class LocalController:
     )
     self.controller.init()
     self.axis_data: dict[int, float] = {}
-    self.button_data: dict[int, bool] = {}
+    # bit i is set while pygame button i is pressed
+    self.buttons_bitset: int = 0
     self.hat_data: dict[int, tuple[int, int]] = {}
     self.report_builder: XInput_REPORT_Builder = report_builder
     self.server_list: list[InputServerData] = server_list
+    # build_XInput_REPORT updates report_builder.report in place, so the
+    # set_REPORT calls can be prepared once instead of once per frame
+    self.report_funcs: list[partial] = [
+      partial(BasicGamepadHandler.set_REPORT, server_data.index, report_builder.report)
+      for server_data in server_list
+    ]
 
   def listen(self):
     """Listen for events to happen"""
@@ -120,35 +175,43 @@ class LocalController:
     if not self.axis_data:
       self.axis_data = {}
 
-    if not self.button_data:
-      self.button_data = {}
-      for i in range(self.controller.get_numbuttons()):
-        self.button_data[i] = False
-
     if not self.hat_data:
       self.hat_data = {}
       for i in range(self.controller.get_numhats()):
         self.hat_data[i] = (0, 0)
 
-    while TinkerforgeControl.keep_running:
+    clock = pygame.time.Clock()
+    while True:
+      # cap the frame rate so that an empty event queue doesn't spin the CPU
+      clock.tick(MAX_FRAME_RATE)
+
+      # drain all pending events first, then send a single coalesced report
       for event in pygame.event.get():
         if event.type == pygame.JOYAXISMOTION:
           self.axis_data[event.axis] = round(event.value, 4)
         elif event.type == pygame.JOYBUTTONDOWN:
-          self.button_data[event.button] = True
+          if event.button < BUTTON_COUNT:
+            self.buttons_bitset |= 1 << event.button
         elif event.type == pygame.JOYBUTTONUP:
-          self.button_data[event.button] = False
+          if event.button < BUTTON_COUNT:
+            self.buttons_bitset &= ~(1 << event.button)
         elif event.type == pygame.JOYHATMOTION:
           self.hat_data[event.hat] = event.value
 
-        report: AbstractReport = self.report_builder.build_XInput_REPORT(
-          self.button_data,
-          self.axis_data
-        )
-        for server_data in self.server_list:
-          if server_data.active:
-            func: partial = partial(BasicGamepadHandler.set_REPORT, server_data.index, report)
+      self.report_builder.build_XInput_REPORT(
+        self.buttons_bitset,
+        self.axis_data
+      )
+      report_state: tuple[int, ...] = self.report_builder.report_state()
+      for server_data, func in zip(self.server_list, self.report_funcs):
+        if server_data.active:
+          # skip sending reports the remote gamepad already has
+          if report_state != server_data.last_report:
             server_data.server.execute(func)
+            server_data.last_report = report_state
+        else:
+          # make sure the current state is sent once the server gets reactivated
+          server_data.last_report = None
 
 
 def main():
@@ -168,6 +231,8 @@ def main():
       encryption_key=remote_gamepad.encryption_key,
       encryption_mode=remote_gamepad.encryption_mode
     )
+    # reports are small and latency sensitive, don't let Nagle hold them back
+    input_server.sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
     input_server.add_gamepad(remote_gamepad.index)
     server_list.append(InputServerData(
       input_server,
@@ -179,32 +244,24 @@ def main():
   if len(server_list) == 0:
     print("Config must contain at least 1 remote gamepad!")
     exit(1)
-  hkm = HotkeyManager(server_list, hotkey_list)
+  tinkerforge_control = TinkerforgeControl()
   Thread(
-    target=hkm.scan_loop,
+    target=tinkerforge_control.print_loop,
     daemon=True
   ).start()
-  print("Starting RGB Button control thread...")
-  Thread(
-    target=TinkerforgeControl.start_RGB_Buttons,
-    args=[server_list, settings.tinkerforge],
-    daemon=False
-  ).start()
-  sleep(0.5)
-  controller_client = LocalController(
-    report_builder,
-    server_list,
-    settings.local_gamepad_index
-  )
+  hkm = HotkeyManager(server_list, hotkey_list, tinkerforge_control)
   try:
-    controller_client.listen()
+    print("Connecting to RGB Buttons...")
+    with tinkerforge_control.connect_RGB_Buttons(server_list, settings.tinkerforge):
+      controller_client = LocalController(
+        report_builder,
+        server_list,
+        settings.local_gamepad_index
+      )
+      controller_client.listen()
   except KeyboardInterrupt:
-    TinkerforgeControl.keep_running = False
-    hkm.keep_running = False
-    for server_data in server_list:
-      server_data.server.sock.shutdown(SHUT_RDWR)
-  except ConnectionAbortedError:
-    TinkerforgeControl.keep_running = False
+    pass
+  finally:
     for server_data in server_list:
       server_data.server.sock.shutdown(SHUT_RDWR)
-    raise
+    hkm.unregister_hotkeys()
@@ -7,7 +7,7 @@ from dataclasses import dataclass
 from functools import partial
 from math import ceil
 from math import floor
-from operator import add
+from threading import Event
 from time import sleep
 
 # pip imports
@@ -15,6 +15,7 @@ from colorama import Back
 from colorama import Fore
 from tinkerforge.bricklet_linear_poti_v2 import BrickletLinearPotiV2
 from tinkerforge.bricklet_rgb_led_button import BrickletRGBLEDButton
+from tinkerforge.ip_connection import Error as IPConnectionError
 from tinkerforge.ip_connection import IPConnection
 
 # local imports
@@ -25,15 +26,32 @@ from .config import RGB_Button
 from .config import Tinkerforge_Settings
 
 
-@dataclass
+# color tables have 2**n entries, only precompute them for few gamepads per button
+MAX_COLOR_TABLE_GAMEPADS: int = 8
+
+# upper limit of state lines written to the terminal per second
+MAX_PRINT_RATE: int = 30
+
+
+@dataclass(slots=True)
 class InputServerData:
   server: RemoteInputServer
   index: int
   active: bool
   rgb_button: RGB_Button
-
-
-def print_current_state(server_list: list[InputServerData]):
+  # field values of the last report sent to this server, None if unknown
+  last_report: tuple[int, ...] | None = None
+
+
+def print_current_state(
+  tinkerforge_control: 'TinkerforgeControl',
+  server_list: list[InputServerData]
+):
+  active_state: tuple[bool, ...] = tuple(server.active for server in server_list)
+  if active_state == tinkerforge_control.last_active_state:
+    # nothing visible changed, skip terminal and button updates
+    return
+  tinkerforge_control.last_active_state = active_state
   button_states: list[str] = []
   for server in server_list:
     color: str = (
@@ -42,145 +60,223 @@ def print_current_state(server_list: list[InputServerData]):
       f'{Fore.WHITE}{Back.RED}'
     )
     button_states.append(f'{color}[{server.index}]{Fore.RESET}{Back.RESET}')
-  print(
-    f'{" ".join(button_states)}',
-    end='\r'
-  )
-  TinkerforgeControl.color_all_buttons(server_list)
+  tinkerforge_control.post_state_line(" ".join(button_states))
+  tinkerforge_control.color_all_buttons(server_list)
 
 
 class TinkerforgeControl:
-  host: str = "localhost"
-  port: int = 4223
-  uid: str | None = None  # Change to the UID of your Linear Poti Bricklet 2.0
-  upper_threshold: int = 95
-  lower_threshold: int = 5
-  old_position: int = -100
-  old_section: int = -100
-  keep_running: bool = True
-
-  uid_dict: dict[str, BrickletRGBLEDButton] = {}
+  host: str
+  port: int
+  uid: str | None  # Change to the UID of your Linear Poti Bricklet 2.0
+  upper_threshold: int
+  lower_threshold: int
+  old_position: int
+  old_section: int
+  # active states of all gamepads when print_current_state last ran
+  last_active_state: tuple[bool, ...] | None
+  # latest line posted by post_state_line, consumed by print_loop
+  state_line: str
+  state_line_posted: Event
+  # gamepads controlled by the callbacks, set by connect_LinearPoti / connect_RGB_Buttons
+  server_list: list[InputServerData]
+  section_width: float
+
+  uid_dict: dict[str, BrickletRGBLEDButton]
   # button state is saved independently from InputServerData.active since other
   # events (hotkeys) can manipulate state and we want the buttons to toggle
   # between all or nothing, not from one partial state to the opposite partial
   # state
-  button_state_dict: dict[str, bool] = {}
-  index_dict: dict[str, list[int]] = {}
-  button_settings: list[RGB_Button] = []
+  button_state_dict: dict[str, bool]
+  index_dict: dict[str, list[int]]
+  button_settings: list[RGB_Button]
+  # summed color per button, indexed by bitmask of active gamepads
+  color_tables: dict[str, list[tuple[int, int, int]]]
+  # active states and console message for every linear poti section
+  section_states: list[tuple[bool, ...]]
+  section_messages: list[str]
+
+  def __init__(self) -> None:
+    self.host = "localhost"
+    self.port = 4223
+    self.uid = None
+    self.upper_threshold = 95
+    self.lower_threshold = 5
+    self.old_position = -100
+    self.old_section = -100
+    self.last_active_state = None
+    self.state_line = ""
+    self.state_line_posted = Event()
+    self.server_list = []
+    self.section_width = 1.0
+
+    self.uid_dict = {}
+    self.button_state_dict = {}
+    self.index_dict = {}
+    self.button_settings = []
+    self.color_tables = {}
+    self.section_states = []
+    self.section_messages = []
+
+  def post_state_line(self, line: str) -> None:
+    '''
+    Hand a line over to print_loop, writing to a slow terminal
+    shouldn't block the hotkey and Tinkerforge callback threads.
+    '''
+    self.state_line = line
+    self.state_line_posted.set()
+
+  def print_loop(self) -> None:
+    '''
+    Print the latest posted state line, at most MAX_PRINT_RATE times
+    per second. States posted in between are skipped.
+    '''
+    while True:
+      self.state_line_posted.wait()
+      self.state_line_posted.clear()
+      print(self.state_line, end='\r')
+      sleep(1 / MAX_PRINT_RATE)
 
-  @classmethod
   def cb_button(
-    cls,
-    state,
+    self,
     uid: str,
-    server_list: list[InputServerData]
+    state
   ) -> None:
     if state:  # only trigger on release
+      server_list: list[InputServerData] = self.server_list
       try:
-        new_state = not cls.button_state_dict.get(uid, True)
-        cls.button_state_dict[uid] = new_state
-        for index in cls.index_dict[uid]:
+        new_state = not self.button_state_dict.get(uid, True)
+        self.button_state_dict[uid] = new_state
+        for index in self.index_dict[uid]:
           server_list[index].active = new_state
-        print_current_state(server_list)
+        print_current_state(self, server_list)
       except IndexError:
         pass
 
-  @classmethod
-  def color_all_buttons(cls, server_list: list[InputServerData]) -> None:
-    color_dict: dict[str, tuple[int, int, int]] = {}
-    button_dict: dict[str, BrickletRGBLEDButton] = {}
-    for server_data in server_list:
-      uid: str = server_data.rgb_button.uid
-      old_color = color_dict.get(uid, (0, 0, 0))
-      add_color = (
-        server_data.rgb_button.color_on
-        if server_data.active else
-        server_data.rgb_button.color_off
-      )
-      color_dict[uid] = tuple(
-        map(add, add_color, old_color)
-      )
-      button: BrickletRGBLEDButton = cls.uid_dict[uid]
-      button_dict[uid] = button
-    for uid, button in button_dict.items():
-      button.set_color(*color_dict[uid])
+  def color_all_buttons(self, server_list: list[InputServerData]) -> None:
+    for uid, button in self.uid_dict.items():
+      index_list: list[int] = self.index_dict[uid]
+      active_mask: int = 0
+      for bit, index in enumerate(index_list):
+        if server_list[index].active:
+          active_mask |= 1 << bit
+      table: list[tuple[int, int, int]] | None = self.color_tables.get(uid)
+      if table is not None:
+        button.set_color(*table[active_mask])
+      else:
+        button.set_color(*self.sum_color(index_list, active_mask))
+
+  def sum_color(self, index_list: list[int], active_mask: int) -> tuple[int, int, int]:
+    '''
+    Sum the colors of the gamepads in index_list, bit i of active_mask
+    set = gamepad index_list[i] active.
+    '''
+    red: int = 0
+    green: int = 0
+    blue: int = 0
+    for bit, index in enumerate(index_list):
+      button: RGB_Button = self.button_settings[index]
+      color = button.color_on if active_mask & (1 << bit) else button.color_off
+      red += color[0]
+      green += color[1]
+      blue += color[2]
+    return (red, green, blue)
+
+  def build_color_tables(self) -> None:
+    '''
+    Precompute the summed color of every button for each combination
+    of active states of the gamepads assigned to it. Buttons shared by
+    more than MAX_COLOR_TABLE_GAMEPADS gamepads get no table,
+    color_all_buttons sums their colors directly instead.
+    '''
+    for uid, index_list in self.index_dict.items():
+      if len(index_list) > MAX_COLOR_TABLE_GAMEPADS:
+        continue
+      self.color_tables[uid] = [
+        self.sum_color(index_list, active_mask)
+        for active_mask in range(1 << len(index_list))
+      ]
 
   # Callback function for position callback
-  @classmethod
   def cb_position(
-    cls,
-    position: int,
-    section_width: float,
-    server_list: list[InputServerData]
+    self,
+    position: int
   ) -> None:
-    if abs(position - cls.old_position) > 2:
+    if abs(position - self.old_position) > 2:
+      server_list: list[InputServerData] = self.server_list
 
-      section = int((position - cls.lower_threshold) // section_width)
-      if section == cls.old_section:
+      section = int((position - self.lower_threshold) // self.section_width)
+      if section == self.old_section:
         return
 
-      if section < 0:
-        # None
-        for server_data in server_list:
-          server_data.active = False
-        print("No gamepads active")
-      elif section >= len(server_list):
-        # All
-        for server_data in server_list:
-          server_data.active = True
-        print("All gamepads active")
-      else:
-        # one section only
-        for server_data in server_list:
-          server_data.active = False
-        server_list[section - 1].active = True
-        print(f"Gamepad {server_list[section].index} active")
+      # index 0: None, 1..n: one section only, n+1: All
+      state_index: int = max(0, min(section + 1, len(server_list) + 1))
+      for server_data, active in zip(server_list, self.section_states[state_index]):
+        server_data.active = active
+      self.post_state_line(self.section_messages[state_index])
 
-      cls.old_section = section
-      cls.old_position = position
+      self.old_section = section
+      self.old_position = position
 
-  @classmethod
   def print_steps(
-    cls,
+    self,
     server_list: list[InputServerData],
     section_width: float
   ):
-    print(f"   <{cls.lower_threshold}    : No controllers active")
+    print(f"   <{self.lower_threshold}    : No controllers active")
     for i, server_data in enumerate(server_list):
-      lower_bounds = cls.lower_threshold + ceil(i * section_width)
-      upper_bounds = cls.lower_threshold + floor((i + 0.9999) * section_width)
+      lower_bounds = self.lower_threshold + ceil(i * section_width)
+      upper_bounds = self.lower_threshold + floor((i + 0.9999) * section_width)
       print(
         f"{str(lower_bounds).rjust(3)} to {str(upper_bounds).rjust(3)}: "
         f"controller index {server_data.index} active"
       )
-    print(f"   >={cls.upper_threshold}   : All controllers active")
+    print(f"   >={self.upper_threshold}   : All controllers active")
 
-  @classmethod
-  def start_LinearPoti(
-    cls,
+  @contextmanager
+  def connect_LinearPoti(
+    self,
     server_list: list[InputServerData],
     tinkerforge_settings: Tinkerforge_Settings
-  ) -> None:
-    cls.host = tinkerforge_settings.host
-    cls.port = tinkerforge_settings.port
-    cls.uid = tinkerforge_settings.linear_poti.uid
-    cls.upper_threshold = tinkerforge_settings.linear_poti.upper_threshold
-    cls.lower_threshold = tinkerforge_settings.linear_poti.lower_threshold
-
-    assert(cls.uid is not None)
-    assert(cls.upper_threshold >= cls.lower_threshold)
-
+  ) -> Generator:
+    '''
+    Keep the Linear Poti connected and its callbacks registered
+    for the duration of the with-block.
+    '''
+    self.host = tinkerforge_settings.host
+    self.port = tinkerforge_settings.port
+    self.uid = tinkerforge_settings.linear_poti.uid
+    self.upper_threshold = tinkerforge_settings.linear_poti.upper_threshold
+    self.lower_threshold = tinkerforge_settings.linear_poti.lower_threshold
+
+    assert(self.uid is not None)
+    assert(self.upper_threshold >= self.lower_threshold)
+
+    self.server_list = server_list
     number_of_sections = len(server_list)
-    section_width = (cls.upper_threshold - cls.lower_threshold) / number_of_sections
-    cls.print_steps(server_list, section_width)
+    section_width = (self.upper_threshold - self.lower_threshold) / number_of_sections
+    self.section_width = section_width
+    self.print_steps(server_list, section_width)
+    self.section_states = (
+      [(False,) * number_of_sections]
+      + [
+        tuple(i == k for i in range(number_of_sections))
+        for k in range(number_of_sections)
+      ]
+      + [(True,) * number_of_sections]
+    )
+    self.section_messages = (
+      ["No gamepads active"]
+      + [f"Gamepad {server_data.index} active" for server_data in server_list]
+      + ["All gamepads active"]
+    )
 
     ipcon = IPConnection()  # Create IP connection
-    lp = BrickletLinearPotiV2(cls.uid, ipcon)  # Create device object
+    lp = BrickletLinearPotiV2(self.uid, ipcon)  # Create device object
 
     @contextmanager
     def ipcon_connect_manager(ipcon: IPConnection) -> Generator:
       try:
-        ipcon.connect(cls.host, cls.port)  # Connect to brickd
+        ipcon.connect(self.host, self.port)  # Connect to brickd
         yield
       finally:
         ipcon.disconnect()
@@ -188,19 +284,10 @@ class TinkerforgeControl:
       # Don't use device before ipcon is connected
     with ipcon_connect_manager(ipcon):
       # initialize current position
-      number_of_sections = len(server_list)
-      section_width = (cls.upper_threshold - cls.lower_threshold) / number_of_sections
-      cls.cb_position(
-        lp.get_position(),
-        section_width=section_width,
-        server_list=server_list
-      )
+      self.cb_position(lp.get_position())
 
       # Register position callback to function cb_position
-      lp.register_callback(
-        lp.CALLBACK_POSITION,
-        partial(cls.cb_position, section_width=section_width, server_list=server_list)
-      )
+      lp.register_callback(lp.CALLBACK_POSITION, self.cb_position)
 
       # Set period for position callback to 0.25s (250ms) without a threshold
       lp.set_position_callback_configuration(
@@ -211,56 +298,81 @@ class TinkerforgeControl:
         max=0
       )
 
-      while cls.keep_running:
-        sleep(0.25)
+      # callbacks are invoked from the IPConnection thread
+      yield
 
-  @classmethod
-  def start_RGB_Buttons(
-    cls,
+  @contextmanager
+  def connect_RGB_Buttons(
+    self,
     server_list: list[InputServerData],
     tinkerforge_settings: Tinkerforge_Settings
-  ) -> None:
-    cls.host = tinkerforge_settings.host
-    cls.port = tinkerforge_settings.port
-    cls.button_settings = [
+  ) -> Generator:
+    '''
+    Keep the RGB Buttons connected and their callbacks registered
+    for the duration of the with-block.
+    '''
+    self.host = tinkerforge_settings.host
+    self.port = tinkerforge_settings.port
+    self.server_list = server_list
+    self.button_settings = [
       server_data.rgb_button
       for server_data in server_list
     ]
 
-    assert(len(cls.button_settings) > 0)
+    assert(len(self.button_settings) > 0)
 
     ipcon = IPConnection()  # Create IP connection
-    for i, button in enumerate(cls.button_settings):
-      if button.uid not in cls.uid_dict:
-        rgb_button = BrickletRGBLEDButton(button.uid, ipcon)
-        cls.uid_dict[button.uid] = rgb_button
-      else:
-        rgb_button = cls.uid_dict[button.uid]
-      try:
-        index_list = cls.index_dict[button.uid]
-      except KeyError:
-        index_list = []
-        cls.index_dict[button.uid] = index_list
-      index_list.append(i)
-
-    @contextmanager
-    def ipcon_connect_manager(ipcon: IPConnection) -> Generator:
-      try:
-        ipcon.connect(cls.host, cls.port)  # Connect to brickd
-        yield
-      finally:
-        for button in cls.uid_dict.values():
-          button.set_color(0, 0, 0)
-        ipcon.disconnect()
-
+    rgb_buttons: dict[str, BrickletRGBLEDButton] = {}
+    connected: bool = False
+    try:
+      # device objects validate their UID, e.g. the empty default of a
+      # config without rgb_button, so create them inside the guarded block
+      for i, button in enumerate(self.button_settings):
+        if button.uid not in rgb_buttons:
+          rgb_buttons[button.uid] = BrickletRGBLEDButton(button.uid, ipcon)
+        try:
+          index_list = self.index_dict[button.uid]
+        except KeyError:
+          index_list = []
+          self.index_dict[button.uid] = index_list
+        index_list.append(i)
+      self.build_color_tables()
+
+      ipcon.connect(self.host, self.port)  # Connect to brickd
       # Don't use device before ipcon is connected
-    with ipcon_connect_manager(ipcon):
-      for uid, button in cls.uid_dict.items():
-        cls.cb_button(True, uid=uid, server_list=server_list)
-        button.register_callback(
-          button.CALLBACK_BUTTON_STATE_CHANGED,
-          partial(cls.cb_button, uid=uid, server_list=server_list)
+      for uid, rgb_button in rgb_buttons.items():
+        self.cb_button(uid, True)
+        rgb_button.register_callback(
+          rgb_button.CALLBACK_BUTTON_STATE_CHANGED,
+          partial(self.cb_button, uid)
         )
+      # buttons are only colored once they are usable, print_current_state
+      # skips unchanged states, so color them once unconditionally
+      self.uid_dict = rgb_buttons
+      self.color_all_buttons(server_list)
+      connected = True
+    except (OSError, IPConnectionError) as e:
+      print(f"Failed to set up RGB Buttons, continuing without them: {e!r}")
+      self.uid_dict = {}
+      if ipcon.get_connection_state() != IPConnection.CONNECTION_STATE_DISCONNECTED:
+        ipcon.disconnect()
+
+    if not connected:
+      yield
+      return
 
-      while cls.keep_running:
-        sleep(0.25)
+    try:
+      # callbacks are invoked from the IPConnection thread
+      yield
+    finally:
+      self.uid_dict = {}
+      try:
+        for rgb_button in rgb_buttons.values():
+          rgb_button.set_color(0, 0, 0)
+      except (OSError, IPConnectionError) as e:
+        # brickd went away during the session, don't mask the exception
+        # that ended the with-block
+        print(f"Failed to turn off RGB Buttons: {e!r}")
+      finally:
+        if ipcon.get_connection_state() != IPConnection.CONNECTION_STATE_DISCONNECTED:
+          ipcon.disconnect()